@@ -1,14 +1,152 @@
 import anthropic
+import asyncio
+import json
+import logging
 import os
-from typing import List, Dict
+import re
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 import datasets
 
+from llm_cache import LLMCache, cache_from_env
+from logging_setup import setup_logging
+
+if TYPE_CHECKING:
+    # numpy and sentence-transformers are optional ('semantic' extra)
+    from semantic_cache import SemanticCache
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Numbered ("1.", "2)") or bulleted ("-", "•", "*") list items
+_BULLET_RE = re.compile(r'^[ \t]*(?:\d+[.)][ \t]*|[-•*][ \t]+)(\S.*?)[ \t\r]*$', re.MULTILINE)
+
+_WORD_RE = re.compile(r"\w+")
+
+_EXTRACTION_TMPL = """Analyze the following user prompt and identify any presumptions, assumptions, or claims that should be fact-checked.
+
+Focus on:
+1. Medical or health-related claims
+2. Scientific or technical assumptions
+3. Claims about treatments, procedures, or conditions
+4. Statements presented as facts that may not be accurate
+
+User prompt:
+{user_prompt}
+
+Extract each presumption as a clear, fact-checkable question. Format your response as a numbered list where each item is a question that can be fact-checked.
+
+Example format:
+1. Is [condition] treatable at [stage]?
+2. Does [treatment] cause [effect]?
+
+Only include genuine presumptions that need verification. If there are no presumptions to check, respond with "No presumptions found."
+"""
+
+_FACT_CHECK_TMPL = """Please fact-check the following question/presumption:
+
+{presumption}
+
+Provide:
+1. A direct answer to the question
+2. Key facts and evidence
+3. Any important nuances or context
+4. Whether the underlying presumption in the original statement appears to be accurate or not
+
+Be clear and accurate."""
+
+_ANALYSIS_TMPL = """Analyze the following user prompt and identify any presumptions, assumptions, or claims that should be fact-checked, then fact-check each one.
+
+Focus on:
+1. Medical or health-related claims
+2. Scientific or technical assumptions
+3. Claims about treatments, procedures, or conditions
+4. Statements presented as facts that may not be accurate
+
+User prompt:
+{user_prompt}
+
+For each presumption, write it as a clear, fact-checkable question and fact-check it. The fact-check should provide:
+1. A direct answer to the question
+2. Key facts and evidence
+3. Any important nuances or context
+4. Whether the underlying presumption in the original statement appears to be accurate or not
+
+Respond with only a JSON array, with no other text, in this format:
+[{{"presumption": "Is [condition] treatable at [stage]?", "fact_check": "..."}}]
+
+Only include genuine presumptions that need verification. If there are no presumptions to check, respond with [].
+"""
+
+_CONSOLIDATION_TMPL = """Create a concise version of the following fact-check results. Only include incorrect presumptions and summarize the key facts and evidence for each. Omit any presumptions that were found to be accurate.
+        
+        {string_results}
+        """
+
+
+def _parse_presumptions(response_text: str) -> List[str]:
+    """
+    Parse the numbered or bulleted list items out of an extraction response.
+    """
+    if "No presumptions found" in response_text:
+        return []
+    return _BULLET_RE.findall(response_text)
+
+
+def _parse_analysis(response_text: str) -> Optional[List[Dict[str, str]]]:
+    """
+    Parse the JSON array of presumption/fact-check objects out of a combined
+    analysis response, or return None if there is no valid array.
+    """
+    # Tolerate code fences or prose (which may hold brackets of its own)
+    # around the array by decoding from each "[" until one parses
+    decoder = json.JSONDecoder()
+    start = response_text.find("[")
+    while start != -1:
+        try:
+            items, _ = decoder.raw_decode(response_text, start)
+        except json.JSONDecodeError:
+            items = None
+        if isinstance(items, list) and all(
+            isinstance(item, dict) and "presumption" in item and "fact_check" in item
+            for item in items
+        ):
+            return [
+                {"presumption": str(item["presumption"]), "fact_check": str(item["fact_check"])}
+                for item in items
+            ]
+        start = response_text.find("[", start + 1)
+    return None
+
+
+def _dedupe_presumptions(presumptions: List[str]) -> List[str]:
+    """
+    Drop presumptions made of the same words as an earlier one, ignoring
+    case, punctuation and word order. Repeated words count, so the key is the
+    sorted word list rather than a set.
+    """
+    seen = set()
+    unique = []
+    for presumption in presumptions:
+        key = " ".join(sorted(_WORD_RE.findall(presumption.lower())))
+        if key not in seen:
+            seen.add(key)
+            unique.append(presumption)
+    return unique
+
+
 class PresumptionValidator:
     
-    def __init__(self, api_key: str = None, model: str = "claude-3-5-haiku-20241022"):
+    def __init__(self, api_key: str = None, model: str = "claude-3-5-haiku-20241022",
+                 cache: Optional[LLMCache] = None,
+                 semantic_cache: Optional["SemanticCache"] = None,
+                 fused: bool = False,
+                 extract_model: Optional[str] = None,
+                 consolidate_model: Optional[str] = None,
+                 max_inflight: Optional[int] = None):
 
         self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
         if not self.api_key:
@@ -16,10 +154,55 @@ class PresumptionValidator:
                 "API key must be provided or set in .env file.\n"
             )
         
-        self.client = anthropic.Anthropic(api_key=self.api_key)
+        # HTTP/2 lets concurrent requests share one pooled connection
+        self.client = anthropic.AsyncAnthropic(
+            api_key=self.api_key,
+            http_client=anthropic.DefaultAsyncHttpxClient(http2=True)
+        )
         self.model = model
+        # Extraction and consolidation are lighter tasks and can use a cheaper
+        # model than fact-checking; both default to the fact-check model
+        self.extract_model = extract_model or model
+        self.consolidate_model = consolidate_model or model
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        # Extract and fact-check in one call instead of 1 + N calls
+        self.fused = fused
+        # Cap concurrent requests to stay under the account's rate limit
+        if max_inflight is None:
+            raw = os.environ.get("ANTHROPIC_MAX_INFLIGHT", "8")
+            try:
+                max_inflight = int(raw)
+            except ValueError:
+                raise ValueError(
+                    f"ANTHROPIC_MAX_INFLIGHT must be a positive integer, got {raw!r}"
+                ) from None
+        if max_inflight < 1:
+            raise ValueError(
+                f"max_inflight (or ANTHROPIC_MAX_INFLIGHT) must be at least 1, got {max_inflight}"
+            )
+        self._inflight = asyncio.Semaphore(max_inflight)
+    
+    async def _cached_create(self, **kwargs) -> Tuple[str, str]:
+        """
+        Call Claude and return the reply text and stop reason, serving repeats
+        from the cache.
+        """
+        # diskcache does blocking SQLite I/O, so keep it off the event loop
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, kwargs)
+            if cached is not None:
+                return tuple(cached)
+
+        async with self._inflight:
+            message = await self.client.messages.create(**kwargs)
+        reply = (message.content[0].text, message.stop_reason)
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, kwargs, reply)
+        return reply
     
-    def extract_presumptions(self, user_prompt: str) -> List[str]:
+    async def extract_presumptions(self, user_prompt: str) -> List[str]:
         """
         Extract presumptions from the user's prompt using Claude.
         
@@ -29,52 +212,19 @@ class PresumptionValidator:
         Returns:
             List of presumptions found in the prompt
         """
-        extraction_prompt = f"""Analyze the following user prompt and identify any presumptions, assumptions, or claims that should be fact-checked.
-
-Focus on:
-1. Medical or health-related claims
-2. Scientific or technical assumptions
-3. Claims about treatments, procedures, or conditions
-4. Statements presented as facts that may not be accurate
-
-User prompt:
-{user_prompt}
-
-Extract each presumption as a clear, fact-checkable question. Format your response as a numbered list where each item is a question that can be fact-checked.
-
-Example format:
-1. Is [condition] treatable at [stage]?
-2. Does [treatment] cause [effect]?
-
-Only include genuine presumptions that need verification. If there are no presumptions to check, respond with "No presumptions found."
-"""
+        extraction_prompt = _EXTRACTION_TMPL.format(user_prompt=user_prompt)
         
-        message = self.client.messages.create(
-            model=self.model,
+        response_text, _ = await self._cached_create(
+            model=self.extract_model,
             max_tokens=1024,
             messages=[
                 {"role": "user", "content": extraction_prompt}
             ]
         )
         
-        response_text = message.content[0].text
-        
-        # Parse the response to extract questions
-        presumptions = []
-        if "No presumptions found" not in response_text:
-            lines = response_text.strip().split('\n')
-            for line in lines:
-                line = line.strip()
-                # Remove numbering (e.g., "1. ", "2. ", etc.)
-                if line and (line[0].isdigit() or line.startswith('-') or line.startswith('•')):
-                    # Remove common list prefixes
-                    cleaned = line.lstrip('0123456789.-•) ').strip()
-                    if cleaned:
-                        presumptions.append(cleaned)
-        
-        return presumptions
+        return _parse_presumptions(response_text)
     
-    def fact_check_presumption(self, presumption: str) -> Dict[str, str]:
+    async def fact_check_presumption(self, presumption: str) -> Dict[str, str]:
         """
         Fact-check a single presumption using Claude with web search capability.
         
@@ -84,19 +234,19 @@ Only include genuine presumptions that need verification. If there are no presum
         Returns:
             Dictionary containing the presumption and fact-check result
         """
-        fact_check_prompt = f"""Please fact-check the following question/presumption:
+        # Near-duplicate presumptions reuse an earlier fact-check by the same
+        # model; embedding runs in a thread so it doesn't stall other requests
+        if self.semantic_cache is not None:
+            cached = await asyncio.to_thread(self.semantic_cache.get, presumption, self.model)
+            if cached is not None:
+                return {
+                    "presumption": presumption,
+                    "fact_check": cached["fact_check"]
+                }
 
-{presumption}
-
-Provide:
-1. A direct answer to the question
-2. Key facts and evidence
-3. Any important nuances or context
-4. Whether the underlying presumption in the original statement appears to be accurate or not
+        fact_check_prompt = _FACT_CHECK_TMPL.format(presumption=presumption)
 
-Be clear and accurate."""
-
-        message = self.client.messages.create(
+        fact_check, _ = await self._cached_create(
             model=self.model,
             max_tokens=2048,
             messages=[
@@ -104,32 +254,115 @@ Be clear and accurate."""
             ]
         )
         
-        return {
+        result = {
             "presumption": presumption,
-            "fact_check": message.content[0].text
+            "fact_check": fact_check
         }
+        if self.semantic_cache is not None:
+            await asyncio.to_thread(self.semantic_cache.add, presumption, result, self.model)
+        return result
+    
+    async def analyze_prompt(self, user_prompt: str, label: str = "") -> Optional[List[Dict[str, str]]]:
+        """
+        Extract and fact-check all presumptions with a single Claude call.
+        
+        Args:
+            user_prompt: The user's input text
+            label: Prefix for log lines, to tell concurrent prompts apart
+            
+        Returns:
+            List of presumption/fact-check dictionaries, or None if the
+            response was cut off or could not be parsed
+        """
+        prefix = f"{label} " if label else ""
+        analysis_prompt = _ANALYSIS_TMPL.format(user_prompt=user_prompt)
+
+        # One reply holds every fact-check (up to 2048 tokens each on the
+        # two-step path), so allow the model's full output length
+        response_text, stop_reason = await self._cached_create(
+            model=self.model,
+            max_tokens=8192,
+            messages=[
+                {"role": "user", "content": analysis_prompt}
+            ]
+        )
+        if stop_reason == "max_tokens":
+            logger.warning("%sCombined analysis was cut off at max_tokens", prefix)
+            return None
+
+        fact_checks = _parse_analysis(response_text)
+        if fact_checks is None:
+            return None
+
+        # Same duplicate filter as the two-step path, keeping the first
+        # fact-check for each presumption
+        by_presumption = {}
+        for result in fact_checks:
+            by_presumption.setdefault(result["presumption"], result)
+        unique = [by_presumption[p] for p in _dedupe_presumptions(list(by_presumption))]
+        if len(unique) < len(fact_checks):
+            logger.info("%sCollapsed %d duplicate presumption(s)", prefix, len(fact_checks) - len(unique))
+
+        # Presumptions are only known once the reply arrives, so the semantic
+        # cache can't be consulted here, but later prompts can reuse these
+        if self.semantic_cache is not None:
+            await asyncio.gather(*(
+                asyncio.to_thread(self.semantic_cache.add, result["presumption"], result, self.model)
+                for result in unique
+            ))
+        return unique
     
-    def validate_prompt(self, user_prompt: str) -> Dict:
+    async def validate_prompt(self, user_prompt: str, label: str = "") -> Dict:
         """
         Complete validation pipeline: extract and fact-check all presumptions.
         
         Args:
             user_prompt: The user's input text
+            label: Prefix for progress log lines, to tell concurrent prompts apart
             
         Returns:
             Dictionary containing original prompt, presumptions, and fact-checks
         """
-        print("Extracting presumptions...")
-        presumptions = self.extract_presumptions(user_prompt)
-        
-        print(f"Found {len(presumptions)} presumption(s) to fact-check")
+        prefix = f"{label} " if label else ""
+        if self.fused:
+            logger.info("%sAnalyzing presumptions...", prefix)
+            fact_checks = await self.analyze_prompt(user_prompt, label)
+            if fact_checks is not None:
+                return {
+                    "original_prompt": user_prompt,
+                    "presumptions_found": len(fact_checks),
+                    "results": fact_checks
+                }
+            logger.info("%sCould not use combined analysis, falling back to separate calls", prefix)
+
+        logger.info("%sExtracting presumptions...", prefix)
+        presumptions = await self.extract_presumptions(user_prompt)
+        unique = _dedupe_presumptions(presumptions)
+        if len(unique) < len(presumptions):
+            logger.info("%sCollapsed %d duplicate presumption(s)", prefix, len(presumptions) - len(unique))
+        presumptions = unique
         
-        fact_checks = []
-        for i, presumption in enumerate(presumptions, 1):
-            print(f"Fact-checking presumption {i}/{len(presumptions)}...")
-            result = self.fact_check_presumption(presumption)
-            fact_checks.append(result)
+        logger.info("%sFound %d presumption(s) to fact-check", prefix, len(presumptions))
         
+        # Fact-checks are independent, so run them concurrently. Every check
+        # finishes before a failure is raised, so none is left running
+        fact_checks = await asyncio.gather(
+            *(self.fact_check_presumption(presumption) for presumption in presumptions),
+            return_exceptions=True
+        )
+        failures = [
+            (presumption, outcome) for presumption, outcome in zip(presumptions, fact_checks)
+            if isinstance(outcome, BaseException)
+        ]
+        for presumption, error in failures:
+            logger.error("%sFact-check failed for %r", prefix, presumption, exc_info=error)
+        # A report missing a fact-check would be consolidated and scored as if
+        # it were complete, so the whole prompt fails instead
+        if failures:
+            raise RuntimeError(
+                f"{len(failures)} of {len(presumptions)} fact-check(s) failed"
+            ) from failures[0][1]
+
         return {
             "original_prompt": user_prompt,
             "presumptions_found": len(presumptions),
@@ -173,30 +406,31 @@ Be clear and accurate."""
         Returns:
             Formatted string of the entire validation report
         """
-        lines = []
-        lines.append("="*80)
-        lines.append("PRESUMPTION VALIDATION REPORT")
-        lines.append("="*80)
-        
-        lines.append("\nORIGINAL PROMPT:")
-        lines.append("-" * 80)
-        lines.append(validation_result["original_prompt"])
-        
-        lines.append(f"\n\nPRESUMPTIONS FOUND: {validation_result['presumptions_found']}")
-        lines.append("="*80)
+        lines = [
+            "="*80,
+            "PRESUMPTION VALIDATION REPORT",
+            "="*80,
+            "\nORIGINAL PROMPT:",
+            "-" * 80,
+            validation_result["original_prompt"],
+            f"\n\nPRESUMPTIONS FOUND: {validation_result['presumptions_found']}",
+            "="*80,
+        ]
         
         for i, result in enumerate(validation_result["results"], 1):
-            lines.append(f"\n{i}. PRESUMPTION:")
-            lines.append("-" * 80)
-            lines.append(result["presumption"])
-            lines.append("\nFACT-CHECK:")
-            lines.append("-" * 80)
-            lines.append(result["fact_check"])
-            lines.append("")
+            lines.extend((
+                f"\n{i}. PRESUMPTION:",
+                "-" * 80,
+                result["presumption"],
+                "\nFACT-CHECK:",
+                "-" * 80,
+                result["fact_check"],
+                "",
+            ))
         
         return "\n".join(lines)
     
-    def consolidate_results(self, validation_result: Dict) -> str:
+    async def consolidate_results(self, validation_result: Dict) -> str:
         """
         Consolidate all fact-check results into a single summary.
         
@@ -206,26 +440,90 @@ Be clear and accurate."""
 
         string_results = self.validation_results_to_string(validation_result)
 
-        consolidation_prompt = """Create a concise version of the following fact-check results. Only include incorrect presumptions and summarize the key facts and evidence for each. Omit any presumptions that were found to be accurate.
-        
-        {string_results}
-        """
-        message = self.client.messages.create(
-            model=self.model,
+        consolidated, _ = await self._cached_create(
+            model=self.consolidate_model,
             max_tokens=2048,
             messages=[
-                {"role": "user", "content": consolidation_prompt.format(string_results=string_results)}
+                {"role": "user", "content": _CONSOLIDATION_TMPL.format(string_results=string_results)}
             ]
         )
-        return message.content[0].text
+        return consolidated
     
     def save_results(self, validation_result: Dict, filename: str):
-        with open(filename, "w") as f:
-            f.write(self.validation_results_to_string(validation_result))
+        Path(filename).write_text(self.validation_results_to_string(validation_result), encoding="utf-8", newline="\n")
     
     def save_consolidated(self, consolidated_text: str, filename: str):
-        with open(filename, "w") as f:
-            f.write(consolidated_text)
+        Path(filename).write_text(consolidated_text, encoding="utf-8", newline="\n")
+
+
+async def validate_and_save(validator: PresumptionValidator, i: int, example_prompt: str, save_path: str):
+    """
+    Validate, consolidate and save the results for a single dataset prompt.
+    """
+    logger.info("\n\n=== VALIDATING PROMPT %d/20 ===", i + 1)
+    # Run validation
+    results = await validator.validate_prompt(example_prompt, label=f"[prompt {i+1}/20]")
+    consolidated = await validator.consolidate_results(results)
+    logger.info("\n\nCONSOLIDATED SUMMARY OF INCORRECT PRESUMPTIONS (prompt %d/20):\n%s\n%s", i + 1, "-" * 80, consolidated)
+    validator.save_consolidated(consolidated, f"{save_path}/consolidated_results_{i}.txt")
+    validator.save_results(results, f"{save_path}/full_results_{i}.txt")
+
+
+    # Full report only at DEBUG, so normal runs skip formatting it
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("\n%s", validator.validation_results_to_string(results))
+
+
+def semantic_cache_from_env() -> Optional["SemanticCache"]:
+    """
+    Return a SemanticCache stored in $SEMANTIC_CACHE_DIR, or None when it is
+    unset. Requires the optional 'semantic' extra.
+    """
+    directory = os.environ.get("SEMANTIC_CACHE_DIR")
+    if not directory:
+        return None
+    from semantic_cache import SemanticCache
+    return SemanticCache(directory)
+
+
+async def run_all(save_path: str, cache: Optional[LLMCache] = None,
+                  semantic_cache: Optional["SemanticCache"] = None, fused: bool = False) -> bool:
+    """
+    Validate the first 20 dataset prompts concurrently.
+    
+    Returns:
+        True if every prompt was validated and saved
+    """
+    # Initialize validator once (reads API key from .env file)
+    try:
+        validator = PresumptionValidator(model="claude-3-5-haiku-20241022", cache=cache,
+                                         semantic_cache=semantic_cache, fused=fused)
+    except ValueError as e:
+        logger.error("Error: %s", e)
+        return False
+
+    ds = datasets.load_from_disk("cancer_myth_dataset")['validation']
+    # A batch slice returns plain lists; indexing a column would yield rows lazily
+    questions = ds.select_columns(['question'])[:20]['question']
+
+    # One failing prompt should not take down the rest of the run
+    try:
+        outcomes = await asyncio.gather(
+            *(validate_and_save(validator, i, question, save_path) for i, question in enumerate(questions)),
+            return_exceptions=True
+        )
+    finally:
+        await validator.client.close()
+    if semantic_cache is not None:
+        stats = semantic_cache.stats()
+        logger.info("Semantic cache: %d hit(s), %d miss(es), hit rate %.0f%%",
+                    stats["hits"], stats["misses"], stats["hit_rate"] * 100)
+    failures = 0
+    for i, outcome in enumerate(outcomes):
+        if isinstance(outcome, BaseException):
+            failures += 1
+            logger.error("Error on prompt %d/20: %s", i + 1, outcome, exc_info=outcome)
+    return failures == 0
 
 
 def main():
@@ -237,29 +535,20 @@ def main():
 # her companions that because it is at an advanced stage, no treatment will
 # be done. What should we expect?"""
     save_path = "sample_outputs/claude_3.5_haiku"
-    os.makedirs(save_path, exist_ok=True)
-    for i in range(20):
-        example_prompt = datasets.load_from_disk("cancer_myth_dataset")['validation'][i]['question']
-        print(f"\n\n=== VALIDATING PROMPT {i+1}/20 ===")
-        # Initialize validator (reads API key from .env file)
-        try:
-            validator = PresumptionValidator(model="claude-3-5-haiku-20241022")
-            
-            # Run validation
-            results = validator.validate_prompt(example_prompt)
-            consolidated = validator.consolidate_results(results)
-            print("\n\nCONSOLIDATED SUMMARY OF INCORRECT PRESUMPTIONS:")
-            print("-" * 80)
-            print(consolidated)
-            validator.save_consolidated(consolidated, f"{save_path}/consolidated_results_{i}.txt")
-            validator.save_results(results, f"{save_path}/full_results_{i}.txt")
-
-
-            # Print results
-            validator.print_results(results)
-            
-        except ValueError as e:
-            print(f"Error: {e}")
+    Path(save_path).mkdir(parents=True, exist_ok=True)
+    # Off unless LLM_CACHE_DIR is set, so re-runs draw fresh samples
+    cache = cache_from_env()
+    # Opt-in as well: reuses fact-checks of similar presumptions
+    semantic_cache = semantic_cache_from_env()
+    # FUSED_ANALYSIS=1 extracts and fact-checks each prompt in one call
+    fused = os.environ.get("FUSED_ANALYSIS") == "1"
+    listener = setup_logging()
+    try:
+        ok = asyncio.run(run_all(save_path, cache, semantic_cache, fused))
+    finally:
+        listener.stop()
+    if not ok:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -2,9 +2,19 @@ import anthropic
 import os
 import datasets
 from dotenv import load_dotenv
-import json
-def evaluate_results(consolidated_result: str, information: str, question: str, client: anthropic.Anthropic, model: str) -> str:
-    prompt = f""" You are provided with a medical patient question containing some false presupppositions. Evaluate the following presupposition detection results
+import logging
+import orjson
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from llm_cache import LLMCache, cache_from_env
+from logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+_EVALUATION_TMPL = """ You are provided with a medical patient question containing some false presupppositions. Evaluate the following presupposition detection results
 Please evaluate the answer with the following criteria:
 
 Score -1: The detection fails to recognize or acknowledge false presupposition in the questions.
@@ -19,52 +29,112 @@ detection: {consolidated_result}
 
 Return score only.
 """
-    message = client.messages.create(
-            model=model,
-            max_tokens=1024,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
-    
-    return message.content[0].text
+
+
+def evaluation_request(consolidated_result: str, information: str, question: str, model: str) -> Dict:
+    prompt = _EVALUATION_TMPL.format(question=question, information=information, consolidated_result=consolidated_result)
+    return dict(
+        model=model,
+        max_tokens=1024,
+        messages=[
+            {"role": "user", "content": prompt}
+        ]
+    )
+
+
+def evaluate_batch(items: List[Dict], client: anthropic.Anthropic, model: str,
+                   cache: Optional[LLMCache] = None, max_poll_interval: float = 60) -> List[Optional[str]]:
+    """
+    Score all items with a single Message Batches API submission.
+
+    Items already in the cache are not resubmitted. Scores are returned in
+    the same order as items, with None for entries the batch did not score.
+    """
+    scores = [None] * len(items)
+    pending = {}
+    for i, item in enumerate(items):
+        request = evaluation_request(item['consolidated_result'], item['presupposition_correction'], item['question'], model)
+        cached = cache.get(request) if cache is not None else None
+        if cached is not None:
+            scores[i] = cached
+        else:
+            pending[f"eval_{i}"] = (i, request)
+
+    if not pending:
+        return scores
+
+    batch = client.messages.batches.create(
+        requests=[
+            {"custom_id": custom_id, "params": request}
+            for custom_id, (_, request) in pending.items()
+        ]
+    )
+    logger.info("Submitted batch %s with %d request(s)", batch.id, len(pending))
+
+    # Poll with exponential backoff until the batch has finished processing
+    delay = 1
+    while batch.processing_status != "ended":
+        time.sleep(delay)
+        delay = min(delay * 2, max_poll_interval)
+        batch = client.messages.batches.retrieve(batch.id)
+
+    # Failed entries stay None so the scores already paid for are kept
+    for entry in client.messages.batches.results(batch.id):
+        i, request = pending[entry.custom_id]
+        if entry.result.type != "succeeded":
+            logger.error("Evaluation request %s did not succeed (%s)", entry.custom_id, entry.result.type)
+            continue
+        text = entry.result.message.content[0].text
+        scores[i] = text
+        if cache is not None:
+            cache.set(request, text)
+    return scores
 
 
 def prepare_evaluation(dataset_loc, results_loc, question_numbers):
     ds = datasets.load_from_disk(dataset_loc)
-    items = ds['validation']
+    # Only the columns the evaluation needs, converted as one batch of plain lists
+    columns = ds['validation'].select_columns(['question', 'presupposition_correction'])[:question_numbers]
+    questions = columns['question']
+    corrections = columns['presupposition_correction']
+    results_dir = Path(results_loc)
+    # Plain reads: a few small files, and no event loop of our own, so this
+    # also works from a notebook's running loop
+    consolidated_results = [
+        (results_dir / f"consolidated_results_{i}.txt").read_text(encoding="utf-8")
+        for i in range(question_numbers)
+    ]
     out = []
-    for i in range(question_numbers):
-        item = items[i]
-        consolidated_result = open(os.path.join(results_loc, f"consolidated_results_{i}.txt")).read()
-        print(consolidated_result)
-        item['consolidated_result'] = consolidated_result
-        out.append(item)
+    for question, correction, consolidated_result in zip(questions, corrections, consolidated_results):
+        logger.debug(consolidated_result)
+        out.append({
+            'question': question,
+            'presupposition_correction': correction,
+            'consolidated_result': consolidated_result,
+        })
     return out
 
 if __name__ == "__main__":
     load_dotenv()
-    api_key = os.environ.get("ANTHROPIC_API_KEY")
-    client = anthropic.Anthropic(api_key=api_key)
-    model = "claude-3-5-haiku-20241022"
-
-    items = prepare_evaluation("cancer_myth_dataset", f"sample_outputs/claude_3.5_haiku", 20)
-    results = []
-    for i, item in enumerate(items):
-        print(f"Evaluating on item {i}")
-        out = evaluate_results(item['consolidated_result'], item['presupposition_correction'], item['question'], client, model)
-        results.append(out)
-
-    os.makedirs("evaluation_result", exist_ok=True)
-    with open(os.path.join("evaluation_result", f"{model}.json"), "w") as f:
-        json.dump(results, f, indent=4)
-        
-
-
-
-
-
-
-
-    
-
+    listener = setup_logging()
+    failed = 0
+    try:
+        api_key = os.environ.get("ANTHROPIC_API_KEY")
+        client = anthropic.Anthropic(api_key=api_key)
+        model = "claude-3-5-haiku-20241022"
+        # Off unless LLM_CACHE_DIR is set, so re-runs draw fresh scores
+        cache = cache_from_env()
+
+        items = prepare_evaluation("cancer_myth_dataset", f"sample_outputs/claude_3.5_haiku", 20)
+        results = evaluate_batch(items, client, model, cache)
+
+        os.makedirs("evaluation_result", exist_ok=True)
+        with open(os.path.join("evaluation_result", f"{model}.json"), "wb") as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+        failed = results.count(None)
+        if failed:
+            logger.error("%d of %d evaluation(s) were not scored; they are null in the output", failed, len(results))
+    finally:
+        listener.stop()
+    if failed:
+        sys.exit(1)
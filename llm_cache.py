@@ -0,0 +1,47 @@
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+import diskcache
+
+
+class LLMCache:
+    """
+    Disk-backed cache of Claude replies keyed by the full request.
+
+    The key is the SHA-256 of the request parameters (model, messages,
+    max_tokens, ...), so any change to the prompt or settings is a miss.
+    """
+
+    def __init__(self, directory: str = ".llm_cache", ttl: Optional[float] = None):
+        """
+        Args:
+            directory: Where cached replies are stored
+            ttl: Seconds before an entry expires, or None to keep it forever
+        """
+        self.cache = diskcache.Cache(directory)
+        self.ttl = ttl
+
+    @staticmethod
+    def key(request: Dict) -> str:
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, request: Dict) -> Optional[str]:
+        return self.cache.get(self.key(request))
+
+    def set(self, request: Dict, text: str):
+        self.cache.set(self.key(request), text, expire=self.ttl)
+
+
+def cache_from_env() -> Optional[LLMCache]:
+    """
+    Return an LLMCache stored in $LLM_CACHE_DIR, or None when it is unset.
+
+    Requests are sampled at the default temperature, so replaying cached
+    replies would silently reuse earlier samples; caching is off unless
+    explicitly requested.
+    """
+    directory = os.environ.get("LLM_CACHE_DIR")
+    return LLMCache(directory) if directory else None
@@ -0,0 +1,21 @@
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+
+def setup_logging(level: int = logging.INFO) -> QueueListener:
+    """
+    Send log records through a queue to a background stdout writer, so
+    concurrent tasks never block on console output.
+
+    Returns:
+        The running listener; call stop() on it to flush before exiting
+    """
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    logging.basicConfig(level=level, format="%(message)s", handlers=[QueueHandler(log_queue)])
+    # httpx logs every request at INFO; keep those out of the progress output
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    listener.start()
+    return listener
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """
+    Cache of fact-check results looked up by presumption meaning rather than
+    exact text.
+
+    Presumptions are embedded with a small sentence-transformers model, and a
+    stored result is reused when the cosine similarity to a previously
+    fact-checked presumption exceeds the threshold. Entries are only reused
+    for the model that produced them. Requires the optional ``semantic``
+    extra (sentence-transformers).
+
+    Results become visible once their fact-check finishes, so near-duplicates
+    checked concurrently (e.g. within one gathered batch) both miss; the
+    cache pays off for presumptions recurring in later prompts or runs.
+    """
+
+    def __init__(self, directory: str = ".semantic_cache", threshold: float = 0.92,
+                 model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+        """
+        Args:
+            directory: Where embeddings (raw float32) and results (jsonl) are stored
+            threshold: Minimum cosine similarity for a cache hit
+            model_name: sentence-transformers model used for the embeddings
+        """
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "SemanticCache requires sentence-transformers. "
+                "Install it with the 'semantic' extra."
+            ) from e
+
+        self.model = SentenceTransformer(model_name)
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        # get/add may run in worker threads (asyncio.to_thread)
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        # Raw float32 rows, so each add() appends one row instead of
+        # rewriting every embedding
+        self.embeddings_path = os.path.join(directory, "embeddings.f32")
+        self.results_path = os.path.join(directory, "results.jsonl")
+
+        dim = self.model.get_sentence_embedding_dimension()
+        self.embeddings = np.empty((0, dim), dtype=np.float32)
+        self.results = []
+        if os.path.exists(self.embeddings_path) and os.path.exists(self.results_path):
+            flat = np.fromfile(self.embeddings_path, dtype=np.float32)
+            self.embeddings = flat[:len(flat) // dim * dim].reshape(-1, dim)
+            with open(self.results_path) as f:
+                self.results = [json.loads(line) for line in f if line.strip()]
+            # An interrupted add() can leave a partial row, or one file a row
+            # ahead of the other; rows are written in order, so the common
+            # prefix is consistent
+            if len(flat) % dim or len(self.results) != len(self.embeddings):
+                n = min(len(self.results), len(self.embeddings))
+                logger.warning(
+                    "Semantic cache files disagree (%d embeddings, %d results); keeping the first %d",
+                    len(self.embeddings), len(self.results), n
+                )
+                self.embeddings = self.embeddings[:n]
+                self.results = self.results[:n]
+                self._rewrite()
+        else:
+            # Start both files empty so later appends stay aligned
+            self._rewrite()
+        self.models = np.array([result.get("model") for result in self.results], dtype=object)
+
+    def _encode(self, text: str) -> np.ndarray:
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+    def _rewrite(self):
+        # Write to temporary files and rename, so a crash never leaves a
+        # truncated file behind
+        with open(self.embeddings_path + ".tmp", "wb") as f:
+            self.embeddings.tofile(f)
+        with open(self.results_path + ".tmp", "w") as f:
+            f.writelines(json.dumps(result) + "\n" for result in self.results)
+        os.replace(self.embeddings_path + ".tmp", self.embeddings_path)
+        os.replace(self.results_path + ".tmp", self.results_path)
+
+    def get(self, presumption: str, model: str) -> Optional[Dict[str, str]]:
+        """
+        Return the stored result for the most similar presumption checked by
+        the same model, if any is above the threshold.
+        """
+        embedding = self._encode(presumption)
+        with self._lock:
+            mask = self.models == model
+            if not mask.any():
+                self.misses += 1
+                return None
+
+            # Embeddings are normalized, so the dot product is the cosine similarity
+            sims = np.where(mask, self.embeddings @ embedding, -np.inf)
+            best = int(np.argmax(sims))
+            if sims[best] > self.threshold:
+                self.hits += 1
+                return self.results[best]
+
+            self.misses += 1
+            return None
+
+    def add(self, presumption: str, result: Dict[str, str], model: str):
+        """
+        Store a fact-check result produced by model and persist the cache.
+        """
+        embedding = self._encode(presumption)
+        with self._lock:
+            self.embeddings = np.vstack([self.embeddings, embedding])
+            self.results.append({**result, "model": model})
+            self.models = np.append(self.models, np.array([model], dtype=object))
+
+            with open(self.embeddings_path, "ab") as f:
+                f.write(embedding.tobytes())
+            with open(self.results_path, "a") as f:
+                f.write(json.dumps(self.results[-1]) + "\n")
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
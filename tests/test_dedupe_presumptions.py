@@ -0,0 +1,29 @@
+from deconstruct_generate import _dedupe_presumptions
+
+
+def test_collapses_reordered_words():
+    presumptions = ["Is advanced lymphoma treatable?", "Is lymphoma, advanced, treatable?"]
+    assert _dedupe_presumptions(presumptions) == ["Is advanced lymphoma treatable?"]
+
+
+def test_ignores_case_and_punctuation():
+    presumptions = ["Is stage-IV lymphoma treatable?", "is stage IV lymphoma treatable", "IS STAGE IV LYMPHOMA TREATABLE?!"]
+    assert _dedupe_presumptions(presumptions) == ["Is stage-IV lymphoma treatable?"]
+
+
+def test_keeps_distinct_presumptions_in_order():
+    presumptions = [
+        "Is lymphoma treatable at an advanced stage?",
+        "Does chemotherapy cause hair loss?",
+        "Is lymphoma treatable at an early stage?",
+    ]
+    assert _dedupe_presumptions(presumptions) == presumptions
+
+
+def test_repeated_words_count():
+    presumptions = ["Is surgery needed?", "Is surgery needed surgery?"]
+    assert _dedupe_presumptions(presumptions) == presumptions
+
+
+def test_empty():
+    assert _dedupe_presumptions([]) == []
@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+import pytest
+
+import evaluate_response
+from evaluate_response import evaluate_batch, evaluation_request
+from llm_cache import LLMCache
+
+MODEL = "claude-3-5-haiku-20241022"
+
+
+def make_item(n):
+    return {
+        "question": f"Question {n}?",
+        "presupposition_correction": f"Correction {n}.",
+        "consolidated_result": f"Result {n}.",
+    }
+
+
+def request_for(item):
+    return evaluation_request(item["consolidated_result"], item["presupposition_correction"], item["question"], MODEL)
+
+
+def succeeded(custom_id, text):
+    message = SimpleNamespace(content=[SimpleNamespace(text=text)])
+    return SimpleNamespace(custom_id=custom_id, result=SimpleNamespace(type="succeeded", message=message))
+
+
+def errored(custom_id, result_type="errored"):
+    return SimpleNamespace(custom_id=custom_id, result=SimpleNamespace(type=result_type))
+
+
+class FakeBatches:
+    """Stands in for client.messages.batches; ends after one poll."""
+
+    def __init__(self, results):
+        self._results = results
+        self.submitted = None
+        self.retrieved = 0
+
+    def create(self, requests):
+        self.submitted = requests
+        return SimpleNamespace(id="batch_1", processing_status="in_progress")
+
+    def retrieve(self, batch_id):
+        self.retrieved += 1
+        return SimpleNamespace(id=batch_id, processing_status="ended")
+
+    def results(self, batch_id):
+        return iter(self._results)
+
+
+def fake_client(batches):
+    return SimpleNamespace(messages=SimpleNamespace(batches=batches))
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(evaluate_response.time, "sleep", lambda seconds: None)
+
+
+def test_scores_follow_item_order():
+    items = [make_item(n) for n in range(3)]
+    # The batch may return entries in any order
+    batches = FakeBatches([succeeded("eval_2", "1"), succeeded("eval_0", "-1"), succeeded("eval_1", "0")])
+
+    assert evaluate_batch(items, fake_client(batches), MODEL) == ["-1", "0", "1"]
+    assert [r["custom_id"] for r in batches.submitted] == ["eval_0", "eval_1", "eval_2"]
+    assert batches.retrieved == 1
+
+
+def test_cached_items_are_not_resubmitted(tmp_path):
+    items = [make_item(n) for n in range(3)]
+    cache = LLMCache(str(tmp_path))
+    cache.set(request_for(items[1]), "1")
+    batches = FakeBatches([succeeded("eval_0", "0"), succeeded("eval_2", "-1")])
+
+    assert evaluate_batch(items, fake_client(batches), MODEL, cache) == ["0", "1", "-1"]
+    assert [r["custom_id"] for r in batches.submitted] == ["eval_0", "eval_2"]
+    # New scores are cached for the next run
+    assert cache.get(request_for(items[0])) == "0"
+
+
+def test_fully_cached_run_skips_the_batch(tmp_path):
+    items = [make_item(0)]
+    cache = LLMCache(str(tmp_path))
+    cache.set(request_for(items[0]), "1")
+    batches = FakeBatches([])
+
+    assert evaluate_batch(items, fake_client(batches), MODEL, cache) == ["1"]
+    assert batches.submitted is None
+
+
+def test_failed_entries_are_none_and_successes_kept(tmp_path, caplog):
+    items = [make_item(n) for n in range(3)]
+    cache = LLMCache(str(tmp_path))
+    batches = FakeBatches([succeeded("eval_0", "1"), errored("eval_1"), errored("eval_2", "expired")])
+
+    assert evaluate_batch(items, fake_client(batches), MODEL, cache) == ["1", None, None]
+    assert "eval_1" in caplog.text and "expired" in caplog.text
+    # Only the successful score is cached
+    assert [cache.get(request_for(item)) for item in items] == ["1", None, None]
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from deconstruct_generate import _parse_analysis
+
+ITEMS = [
+    {"presumption": "Is advanced lymphoma untreatable?", "fact_check": "No. Many [advanced] lymphomas respond to treatment."},
+    {"presumption": "Does chemotherapy always fail in older patients?", "fact_check": "No."},
+]
+ARRAY = json.dumps(ITEMS, indent=2)
+
+
+def test_plain_array():
+    assert _parse_analysis(ARRAY) == ITEMS
+
+
+def test_empty_array():
+    assert _parse_analysis("[]") == []
+
+
+def test_code_fence():
+    assert _parse_analysis(f"```json\n{ARRAY}\n```") == ITEMS
+
+
+def test_prose_with_brackets_around_the_array():
+    response = f"Here are the results [2 presumptions]:\n\n{ARRAY}\n\nSources are cited inline [1]."
+    assert _parse_analysis(response) == ITEMS
+
+
+@pytest.mark.parametrize("response", [
+    "No presumptions found.",
+    '[{"presumption": "Is A treatable?"}]',
+    '[{"question": "Is A treatable?", "fact_check": "Yes"}]',
+    '["Is A treatable?"]',
+    '{"presumption": "Is A treatable?", "fact_check": "Yes"}',
+])
+def test_rejects_missing_keys_or_wrong_shape(response):
+    assert _parse_analysis(response) is None
+
+
+@pytest.mark.parametrize("cut", [len(ARRAY) - 1, len(ARRAY) // 2, 40])
+def test_rejects_truncated_output(cut):
+    assert _parse_analysis(ARRAY[:cut]) is None
@@ -0,0 +1,58 @@
+import re
+from pathlib import Path
+
+import pytest
+
+from deconstruct_generate import _parse_presumptions
+
+SAMPLE_OUTPUTS = Path(__file__).resolve().parent.parent / "sample_outputs"
+_RECORDED_RE = re.compile(r"^\d+\. PRESUMPTION:\n-+\n(.*)$", re.MULTILINE)
+
+
+def baseline_parse(response_text):
+    """The line-by-line parser the regex replaced, kept as a reference."""
+    presumptions = []
+    if "No presumptions found" not in response_text:
+        lines = response_text.strip().split('\n')
+        for line in lines:
+            line = line.strip()
+            if line and (line[0].isdigit() or line.startswith('-') or line.startswith('•')):
+                cleaned = line.lstrip('0123456789.-•) ').strip()
+                if cleaned:
+                    presumptions.append(cleaned)
+    return presumptions
+
+
+@pytest.mark.parametrize(
+    "path", sorted(SAMPLE_OUTPUTS.glob("*/full_results_*.txt")), ids=lambda p: f"{p.parent.name}/{p.name}"
+)
+def test_recovers_recorded_presumptions(path):
+    # Rebuild a numbered-list reply from the presumptions the old parser saved
+    recorded = _RECORDED_RE.findall(path.read_text())
+    response = (
+        "Here are the presumptions to fact-check:\n\n"
+        + "\n".join(f"{i}. {p}" for i, p in enumerate(recorded, 1))
+        + "\n\nThese questions can be verified against current medical guidance."
+    )
+    assert _parse_presumptions(response) == recorded
+    assert _parse_presumptions(response) == baseline_parse(response)
+
+
+@pytest.mark.parametrize("response", [
+    "1. Is A treatable?\n2) Is B curable?\n",
+    "Presumptions:\n\n- Is A treatable?\n• Is B curable?\n",
+    "  1.  Is A treatable?  \r\n  2. Is B curable?\r\n",
+    "1. Is A treatable?\n2. \n3.\n- \nIs B curable?\n",
+    "No presumptions found.",
+])
+def test_matches_baseline_parser(response):
+    assert _parse_presumptions(response) == baseline_parse(response)
+
+
+def test_drops_empty_items():
+    assert _parse_presumptions("1. \n2. Is A treatable?\n- \n3.\n") == ["Is A treatable?"]
+
+
+def test_ignores_markdown_emphasis_and_prose_numbers():
+    response = "**Presumptions**\n2023 guidance says otherwise.\n* Is A treatable?\n"
+    assert _parse_presumptions(response) == ["Is A treatable?"]